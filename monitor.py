@@ -1,22 +1,57 @@
-import os, json, time, asyncio
+import os, re, ssl, json, mmap, time, heapq, socket, asyncio
+import httpx
 import requests
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+from itertools import zip_longest
 from urllib.parse import urlparse
 from playwright.async_api import async_playwright, TimeoutError as PwTimeout
 
 DOMAINS_FILE = os.getenv("DOMAINS_FILE", "domains.txt")
 STATE_FILE   = os.getenv("STATE_FILE", "state.json")
+STATE_LOG    = STATE_FILE + ".log"  # append-only delta journal
 
-MODE = os.getenv("MODE", "check").strip().lower()  # check | report
+MODE = os.getenv("MODE", "check").strip().lower()  # check | report | daemon
 CHECK_PATH = os.getenv("CHECK_PATH", "/")
 
+# daemon mode: seconds between passes + periodic browser restart (leak guard)
+INTERVAL_SEC = int(os.getenv("INTERVAL_SEC", "300"))
+BROWSER_RESTART_HOURS = int(os.getenv("BROWSER_RESTART_HOURS", "6"))
+
 # ✅ timeout 30s (set from workflow)
 TIMEOUT_MS = int(os.getenv("TIMEOUT_MS", "30000"))
 
 # only used for TIMEOUT/HTTP5xx threshold
 FAIL_THRESHOLD = int(os.getenv("FAIL_THRESHOLD", "3"))
 
+# cap on the detailed per-URL lines in the report; the worst offenders
+# (highest fail_count) are kept
+MAX_REPORT_ITEMS = int(os.getenv("MAX_REPORT_ITEMS", "150"))
+
+# fail banners always sit near the top of the page; never scan more than this
+MAX_HTML_BYTES = int(os.getenv("MAX_HTML_BYTES", "32768"))
+
 CONCURRENCY = int(os.getenv("CONCURRENCY", "30"))
-BATCH_SIZE  = int(os.getenv("BATCH_SIZE", "250"))
+
+# cap of in-flight checks against any single host; many storefronts share
+# a platform behind one hostname and a burst there looks like an attack
+PER_HOST_LIMIT = max(1, int(os.getenv("PER_HOST_LIMIT", "4")))
+
+# spread escalated checks over several Chromium processes; one renderer
+# main thread stops being the bottleneck on browser-heavy lists
+BROWSER_SHARDS = max(1, int(os.getenv("BROWSER_SHARDS", "1")))
+
+# the fail banners are server-rendered, so the browser runs with JS off
+# by default; set JS_RENDER=1 if a keyword ever needs scripts to appear
+JS_RENDER = os.getenv("JS_RENDER", "0").strip() == "1"
 
 # manual run -> send telegram immediately
 FORCE_SEND = os.getenv("FORCE_SEND", "0").strip() == "1"
@@ -31,21 +66,81 @@ FAIL_KEYWORDS = [
     "this store is unavailable",
 ]
 
+# one O(n) automaton pass over the page instead of a scan per keyword;
+# without pyahocorasick a compiled alternation still beats N python-level
+# `in` checks
+try:
+    import ahocorasick
+    _KW_AUTOMATON = ahocorasick.Automaton()
+    for _k in FAIL_KEYWORDS:
+        _KW_AUTOMATON.add_word(_k, _k)
+    _KW_AUTOMATON.make_automaton()
+except ImportError:
+    _KW_AUTOMATON = None
+
+_FAIL_RE = re.compile("|".join(re.escape(k) for k in FAIL_KEYWORDS), re.IGNORECASE)
+
+def match_fail_keyword(low: str) -> str | None:
+    if _KW_AUTOMATON is not None:
+        for _, kw in _KW_AUTOMATON.iter(low):
+            return kw
+        return None
+    # IGNORECASE: the fallback doesn't depend on the caller lowering first
+    m = _FAIL_RE.search(low)
+    return m.group(0).lower() if m else None
+
+# bytes twins of the keywords: scanning the raw response body avoids a
+# UTF-8 decode of every page (bytes.lower + find are tight C loops)
+_FAIL_KWS_BYTES = tuple(k.encode("utf-8") for k in FAIL_KEYWORDS)
+
+def match_fail_keyword_bytes(raw: bytes) -> str | None:
+    low = raw.lower()
+    if _KW_AUTOMATON is not None:
+        # latin-1 maps bytes 1:1 onto code points, so the str automaton can
+        # walk the lowered body in one pass without a real decode
+        for _, kw in _KW_AUTOMATON.iter(low.decode("latin-1")):
+            return kw
+        return None
+    for kw in _FAIL_KWS_BYTES:
+        if kw in low:
+            return kw.decode()
+    return None
+
 # ---------------- Utils ----------------
 
 def now_utc():
     return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
 
+# fast path for the overwhelmingly common "bare domain" / "scheme://host" lines;
+# anything with a path or other structure falls through to urlparse
+_FAST_URL = re.compile(r"^(https?://)?([^/\s]+)$")
+
 def normalize_url(line: str) -> str:
     s = line.strip()
     if not s or s.startswith("#"):
         return ""
-    if not s.startswith("http://") and not s.startswith("https://"):
-        s = "https://" + s
-    u = urlparse(s)
-    if not u.netloc:
+    m = _FAST_URL.match(s)
+    if m:
+        return f"{m.group(1) or 'https://'}{m.group(2)}{CHECK_PATH}"
+    # slow path: the line carries a path/query — peel the host off manually,
+    # no need for the full urlparse state machine
+    if s.startswith("http://"):
+        scheme, rest = "http://", s[7:]
+    elif s.startswith("https://"):
+        scheme, rest = "https://", s[8:]
+    else:
+        scheme, rest = "https://", s
+    netloc = rest.split("/", 1)[0]
+    if not netloc:
         return ""
-    return f"{u.scheme}://{u.netloc}{CHECK_PATH}"
+    return f"{scheme}{netloc}{CHECK_PATH}"
+
+def short_reason(reason: str | None) -> str:
+    # collapse whitespace without the regex engine and keep lines compact
+    if not reason:
+        return ""
+    r = " ".join(reason.split())
+    return r[:87] + "..." if len(r) > 90 else r
 
 def only_domain(url: str) -> str:
     try:
@@ -57,49 +152,179 @@ def read_domains():
     if not os.path.exists(DOMAINS_FILE):
         raise FileNotFoundError(f"Missing {DOMAINS_FILE}")
 
-    urls = []
-    with open(DOMAINS_FILE, "r", encoding="utf-8-sig") as f:
-        for line in f:
-            u = normalize_url(line)
+    # scan the file as mapped bytes and only decode surviving candidates;
+    # no per-line str allocation for blanks and comments
+    with open(DOMAINS_FILE, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("domains.txt is empty")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # mmap has no split(); materialize once, then split the bytes
+            lines = mm[:].split(b"\n")
+        finally:
+            mm.close()
+
+    if lines and lines[0].startswith(b"\xef\xbb\xbf"):
+        lines[0] = lines[0][3:]
+
+    def candidates():
+        for ln in lines:
+            ln = ln.strip()
+            if not ln or ln.startswith(b"#"):
+                continue
+            u = normalize_url(ln.decode("utf-8", "ignore"))
             if u:
-                urls.append(u)
+                yield u
 
+    # dict.fromkeys dedupes in one order-preserving pass
+    urls = list(dict.fromkeys(candidates()))
     if not urls:
         raise ValueError("domains.txt is empty")
-
-    # dedupe keep order
-    seen = set()
-    uniq = []
-    for u in urls:
-        if u not in seen:
-            uniq.append(u)
-            seen.add(u)
-    return uniq
+    return urls
 
 def load_state():
-    if not os.path.exists(STATE_FILE):
-        return {}
+    state = {}
+    if os.path.exists(STATE_FILE):
+        try:
+            with open(STATE_FILE, "rb") as f:
+                if os.fstat(f.fileno()).st_size > 0:
+                    # one mapping, one parse pass; no intermediate bytes copy
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    try:
+                        # orjson wants bytes-like, not the mmap itself;
+                        # memoryview avoids copying the snapshot
+                        buf = memoryview(mm)
+                        try:
+                            if orjson is not None:
+                                state = orjson.loads(buf) or {}
+                            else:
+                                state = json.loads(bytes(buf)) or {}
+                        finally:
+                            buf.release()
+                    finally:
+                        mm.close()
+        except Exception as e:
+            # a corrupt snapshot shouldn't kill the run, but losing state
+            # silently hides real bugs — say so
+            print(f"[STATE] failed to load {STATE_FILE}: {type(e).__name__}: {e}")
+            state = {}
+    return replay_state_log(state)
+
+def replay_state_log(state):
+    # apply journaled deltas on top of the last full snapshot
+    if not os.path.exists(STATE_LOG):
+        return state
     try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f) or {}
+        with open(STATE_LOG, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = orjson.loads(line) if orjson is not None else json.loads(line)
+                    state[rec["u"]] = rec["s"]
+                except Exception:
+                    # torn tail line from a killed run — ignore
+                    continue
     except Exception:
-        return {}
+        pass
+    return state
+
+def state_entry_changed(prev, entry) -> bool:
+    # timestamps move on every pass; only the fields that feed
+    # classification count as a real change worth persisting
+    if not prev:
+        return True
+    for k in ("fail_count", "last_status", "last_reason", "instant_down"):
+        if prev.get(k) != entry[k]:
+            return True
+    return False
+
+def append_state_delta(url, st):
+    # journal one changed entry; the full snapshot is only rewritten on
+    # compaction (save_state)
+    if orjson is not None:
+        line = orjson.dumps({"u": url, "s": st}) + b"\n"
+    else:
+        line = (json.dumps({"u": url, "s": st}, ensure_ascii=False) + "\n").encode("utf-8")
+    with open(STATE_LOG, "ab") as f:
+        f.write(line)
 
 def save_state(state):
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2)
+    # write-to-temp + atomic rename: a crash mid-write can never leave a
+    # truncated state.json behind
+    if orjson is not None:
+        data = orjson.dumps(state)
+    else:
+        data = json.dumps(state, ensure_ascii=False).encode("utf-8")
+    os.makedirs(os.path.dirname(STATE_FILE) or ".", exist_ok=True)
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, STATE_FILE)
+
+    # the snapshot now covers everything the journal held
+    if os.path.exists(STATE_LOG):
+        os.remove(STATE_LOG)
+
+# one session for all sends: the TLS connection to api.telegram.org is
+# reused when a long summary needs several messages
+_TG_SESSION = requests.Session()
+
+# Telegram caps messages at 4096 chars; stay under with margin
+TG_CHUNK_LIMIT = 4000
+
+def chunk_message(text: str, limit: int = TG_CHUNK_LIMIT):
+    if len(text) <= limit:
+        yield text
+        return
+    cur, cur_len = [], 0
+    for line in text.split("\n"):
+        if len(line) > limit:  # pathological single line
+            if cur:
+                yield "\n".join(cur)
+                cur, cur_len = [], 0
+            while len(line) > limit:
+                yield line[:limit]
+                line = line[limit:]
+        if cur and cur_len + len(line) + 1 > limit:
+            yield "\n".join(cur)
+            cur, cur_len = [], 0
+        cur.append(line)
+        cur_len += len(line) + 1
+    if cur:
+        yield "\n".join(cur)
 
 def send_telegram(text: str):
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
         print("Telegram secrets missing; skip sending.")
         return
     api = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    r = requests.post(api, json={
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": text,
-        "disable_web_page_preview": True
-    }, timeout=25)
-    r.raise_for_status()
+    for part in chunk_message(text):
+        r = _TG_SESSION.post(api, json={
+            "chat_id": TELEGRAM_CHAT_ID,
+            "text": part,
+            "disable_web_page_preview": True
+        }, timeout=25)
+        r.raise_for_status()
+
+async def send_telegram_async(text: str):
+    # async twin for callers already on the event loop; one client keeps
+    # the TLS connection alive across chunked sends
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        print("Telegram secrets missing; skip sending.")
+        return
+    api = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    async with httpx.AsyncClient(timeout=25) as client:
+        for part in chunk_message(text):
+            r = await client.post(api, json={
+                "chat_id": TELEGRAM_CHAT_ID,
+                "text": part,
+                "disable_web_page_preview": True
+            })
+            r.raise_for_status()
 
 # ---------------- Rules ----------------
 
@@ -123,6 +348,16 @@ def classify(st: dict) -> str:
         return "DOWN"
     return "FAIL_TMP"
 
+# group labels are fixed at import; reason_group walks one prefix table
+# (most common first) instead of re-running an if/elif chain per entry
+_TIMEOUT_GROUP = f"FAIL_TMP — TIMEOUT ({TIMEOUT_MS//1000}s)"
+
+_REASON_PREFIX_GROUPS = (
+    ("TIMEOUT", _TIMEOUT_GROUP),
+    ("KEYWORD:enter using password", "FAIL_TMP — PASSWORD PAGE"),
+    ("KEYWORD:", "FAIL_TMP — SOFT ERROR (keyword)"),
+)
+
 def reason_group(st: dict) -> str:
     status = st.get("last_status")
     reason = st.get("last_reason") or ""
@@ -132,48 +367,246 @@ def reason_group(st: dict) -> str:
             return "DOWN — HTTP 404"
         return "DOWN — ERROR/DNS"
 
-    if reason == "TIMEOUT":
-        return f"FAIL_TMP — TIMEOUT ({TIMEOUT_MS//1000}s)"
+    for prefix, group in _REASON_PREFIX_GROUPS:
+        if reason.startswith(prefix):
+            return group
     if isinstance(status, int) and status >= 500:
         return "FAIL_TMP — HTTP 5xx"
-    if reason.startswith("KEYWORD:enter using password"):
-        return "FAIL_TMP — PASSWORD PAGE"
-    if reason.startswith("KEYWORD:"):
-        return "FAIL_TMP — SOFT ERROR (keyword)"
     return "FAIL_TMP — OTHER"
 
 # ---------------- Check ----------------
 
-async def check_one(context, url: str):
-    page = await context.new_page()
+# we only ever scan the server-rendered HTML, so everything heavy can go;
+# scripts stay blocked too unless a JS_RENDER run actually needs them.
+# frozenset: the handler fires for every subresource of every page
+_BLOCK_TYPES = frozenset(
+    {"image", "font", "media", "stylesheet", "xhr", "fetch", "websocket", "other"}
+    | (set() if JS_RENDER else {"script"})
+)
+
+# third-party trackers dominate load time on Shopify/Wix fronts
+_TRACKER_HOSTS = frozenset({
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+})
+# dot-prefixed variants so subdomains match on a label boundary and a
+# shop host that merely ends with a suffix (shop-facebook.com) does not
+_TRACKER_SUFFIXES = tuple("." + h for h in _TRACKER_HOSTS)
+
+async def block_heavy_resources(route):
+    req = route.request
+    if req.resource_type in _BLOCK_TYPES:
+        await route.abort()
+        return
+    # never abort the navigation itself, whatever host it resolves to
+    if req.resource_type != "document":
+        host = urlparse(req.url).netloc
+        if host in _TRACKER_HOSTS or host.endswith(_TRACKER_SUFFIXES):
+            await route.abort()
+            return
+    await route.continue_()
+
+def looks_js_shell(raw: bytes) -> bool:
+    # a 200 whose HTML is just a script loader can't be judged from the
+    # raw body; only a rendered page shows whether a fail banner appears
+    if len(raw) < 512:
+        return True
+    low = raw.lower()
+    return b"<script" in low and b"<body" not in low
+
+def adaptive_timeout_ms(prev: dict) -> int:
+    # fast domains fail fast; slow-but-healthy ones keep real budget
+    rt = prev.get("rt_ms")
+    if not rt:
+        return TIMEOUT_MS
+    return min(TIMEOUT_MS, max(2000, int(4 * rt)))
+
+def _make_ssl_context() -> ssl.SSLContext:
+    # one shared context: built (and its CA store parsed) once per process
+    # instead of per pass, with h2 offered up front via ALPN
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE  # same policy as the browser context
+    ctx.minimum_version = ssl.TLSVersion.TLSv1_2
+    ctx.set_alpn_protocols(["h2", "http/1.1"])
+    return ctx
+
+_SSL_CTX = _make_ssl_context()
+
+async def check_one_http(client, url: str, timeout_ms: int):
+    # Fast path: plain HTTP GET, no browser.
+    # Returns (status, reason, needs_browser, rt_ms, final_url);
+    # needs_browser=True means a keyword matched and rendered JS might
+    # change the verdict. The client follows redirects, so final_url is the
+    # terminal URL of the chain — the browser never has to chase it again.
     status = None
     reason = None
+    final_url = None
+    t0 = time.monotonic()
 
     try:
-        async def block(route):
-            if route.request.resource_type in ("image", "font", "media", "stylesheet"):
-                await route.abort()
+        # stream so the connection is dropped after MAX_HTML_BYTES instead
+        # of downloading a whole product grid we'd never scan
+        async with client.stream("GET", url, timeout=timeout_ms / 1000) as resp:
+            status = resp.status_code
+            final_url = str(resp.url)
+
+            # hard statuses decide the verdict on their own — no keyword scan
+            if status == 404:
+                reason = "HTTP_404"
+            elif status >= 500:
+                reason = f"HTTP_{status}"
             else:
-                await route.continue_()
-        await page.route("**/*", block)
+                raw = b""
+                async for chunk in resp.aiter_bytes(MAX_HTML_BYTES):
+                    raw += chunk
+                    if len(raw) >= MAX_HTML_BYTES:
+                        break
+                raw = raw[:MAX_HTML_BYTES]
 
-        resp = await page.goto(url, timeout=TIMEOUT_MS, wait_until="domcontentloaded")
-        status = resp.status if resp else None
+                kw = match_fail_keyword_bytes(raw)
+                if kw:
+                    # suspicious: let Playwright confirm with a rendered page
+                    return status, f"KEYWORD:{kw}", True, int((time.monotonic() - t0) * 1000), final_url
+
+                if status == 200 and JS_RENDER and looks_js_shell(raw):
+                    # ambiguous JS shell — escalate (only worth it when the
+                    # browser context actually runs scripts)
+                    return status, None, True, int((time.monotonic() - t0) * 1000), final_url
+
+    except httpx.TimeoutException:
+        reason = "TIMEOUT"
+    except Exception as e:
+        reason = f"ERROR:{type(e).__name__}"
+
+    return status, reason, False, int((time.monotonic() - t0) * 1000), final_url
+
+class AdaptiveSemaphore:
+    # AIMD (TCP-style) in-flight cap: a timeout shrinks the window by x0.75,
+    # ten clean checks in a row grow it by one. Timeouts caused by our own
+    # concurrency stop masquerading as DOWN domains.
+    def __init__(self, start: int, floor: int = 4, ceiling: int = None):
+        self._cap = start
+        self._floor = floor
+        self._ceiling = ceiling or max(start * 2, 100)
+        self._sem = asyncio.Semaphore(start)
+        self._debt = 0    # permits to swallow instead of releasing
+        self._streak = 0
+
+    async def __aenter__(self):
+        await self._sem.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._debt > 0:
+            self._debt -= 1
+        else:
+            self._sem.release()
+        return False
+
+    def report(self, timed_out: bool):
+        if timed_out:
+            self._streak = 0
+            new_cap = max(self._floor, int(self._cap * 0.75))
+            self._debt += self._cap - new_cap
+            self._cap = new_cap
+        else:
+            self._streak += 1
+            if self._streak >= 10 and self._cap < self._ceiling:
+                self._streak = 0
+                self._cap += 1
+                self._sem.release()
+
+class PagePool:
+    # long-lived pages, created on demand up to `size`; amortizes page
+    # construction and teardown across the whole run
+    def __init__(self, ctx, size: int):
+        self._ctx = ctx
+        self._size = size
+        self._q = asyncio.Queue()
+        self._pages = []
+
+    async def acquire(self):
+        if self._q.empty() and len(self._pages) < self._size:
+            page = await self._ctx.new_page()
+            self._pages.append(page)
+            return page
+        return await self._q.get()
+
+    async def release(self, page):
+        try:
+            # drop DOM state between uses
+            await page.goto("about:blank")
+        except Exception:
+            pass
+        self._q.put_nowait(page)
+
+    async def close(self):
+        for page in self._pages:
+            try:
+                await page.close()
+            except Exception:
+                pass
+        self._pages = []
+
+async def check_one(pool, url: str, timeout_ms: int = None):
+    page = await pool.acquire()
+    status = None
+    reason = None
+    t0 = time.monotonic()
 
-        # HTML keyword checks (soft errors)
-        html = await page.content()
-        low = html.lower()
-        for k in FAIL_KEYWORDS:
-            if k in low:
-                reason = f"KEYWORD:{k}"
+    try:
+        # fast first attempt, one slower retry: dead domains cost 5s, not
+        # the full budget, while slow-but-alive sites still get theirs.
+        # "commit" returns as soon as response headers arrive; we read the
+        # body explicitly below, so there is no need to wait for DOM parse
+        budget = timeout_ms or TIMEOUT_MS
+        attempts = (5000, budget) if budget > 5000 else (budget,)
+        resp = None
+        for i, t in enumerate(attempts):
+            try:
+                resp = await page.goto(url, timeout=t, wait_until="commit")
                 break
+            except PwTimeout:
+                if i == len(attempts) - 1:
+                    raise
+        status = resp.status if resp else None
 
-        # status-based
-        if reason is None:
-            if status == 404:
-                reason = "HTTP_404"
-            elif isinstance(status, int) and status >= 500:
-                reason = f"HTTP_{status}"
+        # hard statuses decide the verdict on their own — skip the body
+        if status == 404:
+            reason = "HTTP_404"
+        elif isinstance(status, int) and status >= 500:
+            reason = f"HTTP_{status}"
+        elif JS_RENDER:
+            # the point of escalating: judge the page scripts produced,
+            # not the raw bytes the fast path already scanned. "commit"
+            # returned at headers, so give scripts a bounded window to
+            # settle before serializing the DOM
+            try:
+                await page.wait_for_load_state("networkidle", timeout=3000)
+            except PwTimeout:
+                pass  # busy pages never go idle; scan what rendered so far
+            kw = match_fail_keyword((await page.content())[:MAX_HTML_BYTES].lower())
+            if kw:
+                reason = f"KEYWORD:{kw}"
+        else:
+            raw = b""
+            if resp:
+                try:
+                    raw = (await resp.body())[:MAX_HTML_BYTES]
+                except Exception:
+                    raw = b""
+            if raw:
+                kw = match_fail_keyword_bytes(raw)
+            else:
+                kw = match_fail_keyword((await page.content())[:MAX_HTML_BYTES].lower())
+            if kw:
+                reason = f"KEYWORD:{kw}"
 
     except PwTimeout:
         reason = "TIMEOUT"
@@ -182,83 +615,311 @@ async def check_one(context, url: str):
         reason = f"ERROR:{type(e).__name__}"
 
     finally:
-        try:
-            await page.close()
-        except Exception:
-            pass
+        await pool.release(page)
 
-    return url, status, reason
+    return status, reason, int((time.monotonic() - t0) * 1000)
 
-async def run_checks(domains, state):
-    results = []
+async def setup_browser(p):
+    browser = await p.chromium.launch(
+        headless=True,
+        args=["--disable-gpu", "--blink-settings=imagesEnabled=false"],
+    )
+    ctx = await browser.new_context(
+        ignore_https_errors=True,
+        java_script_enabled=JS_RENDER,
+        bypass_csp=True,
+        viewport={"width": 800, "height": 600},
+    )
+    # registered once on the context; every page inherits it, saving one
+    # driver roundtrip per URL
+    await ctx.route("**/*", block_heavy_resources)
+    return browser, ctx
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        ctx = await browser.new_context(ignore_https_errors=True)
-        sem = asyncio.Semaphore(CONCURRENCY)
+async def dns_prefilter(domains):
+    # resolve everything in parallel first; a name that doesn't resolve is
+    # DOWN already, no point spending a full page timeout on it
+    if aiodns is None:
+        return domains, []
+    resolver = aiodns.DNSResolver()
+    tasks = [resolver.gethostbyname(urlparse(u).hostname, socket.AF_INET) for u in domains]
+    resolved = await asyncio.gather(*tasks, return_exceptions=True)
+
+    alive, dead = [], []
+    for u, r in zip(domains, resolved):
+        (dead if isinstance(r, Exception) else alive).append(u)
+    return alive, dead
+
+def update_state_one(state, url, status, reason, rt_ms, final_url, ts):
+    # applied as each check completes; the journal write inside
+    # append_state_delta persists progress even if the run is killed mid-pass
+    prev = state.get(url, {})
+    instant = is_instant_down(reason, status)
+
+    if reason is None:
+        prev_rt = prev.get("rt_ms")
+        ewma = int(0.3 * rt_ms + 0.7 * prev_rt) if prev_rt else rt_ms
+
+        if prev and prev.get("fail_count", 0) == 0 and prev.get("last_status") == status:
+            # steady-state UP: refresh the existing dict in place instead of
+            # allocating a fresh entry per pass
+            prev["rt_ms"] = ewma
+            prev["final_url"] = final_url if final_url != url else None
+            prev["last_ok"] = ts
+            prev["last_checked"] = ts
+            return
+
+        entry = {
+            "fail_count": 0,
+            "last_status": status,
+            "last_reason": None,
+            "instant_down": False,
+            "rt_ms": ewma,
+            "final_url": final_url if final_url != url else None,
+            "last_ok": ts,
+            "last_checked": ts,
+        }
+    else:
+        entry = {
+            "fail_count": int(prev.get("fail_count", 0)) + 1,
+            "last_status": status,
+            "last_reason": reason,
+            "instant_down": instant,
+            "rt_ms": prev.get("rt_ms"),
+            "final_url": (final_url if final_url != url else None) or prev.get("final_url"),
+            "last_ok": prev.get("last_ok"),
+            "last_checked": ts,
+        }
+
+    state[url] = entry
+    if state_entry_changed(prev, entry):
+        append_state_delta(url, entry)
+
+class LazyShards:
+    # browsers + page pools that only come up on the first escalation; a
+    # pass where every domain stays on the HTTP fast path never pays the
+    # Chromium launch at all
+    def __init__(self, p):
+        self._p = p
+        self._shards = None
+        self._pools = None
+        self._lock = asyncio.Lock()
+
+    async def pool_for(self, i: int):
+        async with self._lock:
+            if self._pools is None:
+                self._shards = await setup_shards(self._p)
+                per_shard = -(-CONCURRENCY // len(self._shards))
+                self._pools = [PagePool(c, per_shard) for _, c in self._shards]
+        return self._pools[i % len(self._pools)]
+
+    async def close(self):
+        if self._pools is not None:
+            for pool in self._pools:
+                await pool.close()
+        if self._shards is not None:
+            await close_shards(self._shards)
+        self._pools = None
+        self._shards = None
+
+def interleave_by_host(domains):
+    """Round-robin domains across hosts so same-host URLs are spread out.
+
+    Input files tend to list a platform's shops back to back; checking them
+    in file order serializes on the per-host cap while other hosts idle.
+    """
+    by_host = {}
+    for u in domains:
+        by_host.setdefault(urlparse(u).netloc, []).append(u)
+    return [u for tier in zip_longest(*by_host.values()) for u in tier if u is not None]
+
+async def run_one_pass(shards, domains, state, prefiltered=None):
+    # one timestamp for the whole pass instead of 2 strftime calls per entry
+    ts = now_utc()
+
+    if prefiltered is None:
+        prefiltered = await dns_prefilter(domains)
+    domains, dead = prefiltered
+    for u in dead:
+        update_state_one(state, u, None, "ERROR:DNS", None, None, ts)
+
+    client = httpx.AsyncClient(
+        http2=True,
+        verify=_SSL_CTX,
+        limits=httpx.Limits(
+            max_connections=CONCURRENCY * 4,
+            max_keepalive_connections=CONCURRENCY,
+        ),
+        timeout=TIMEOUT_MS / 1000,
+        follow_redirects=True,
+        # some storefronts serve bot UAs an error shell; look like a browser
+        headers={"User-Agent": (
+            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+        )},
+    )
+
+    # bounded queue + long-lived workers: no batch barriers, and at most
+    # CONCURRENCY checks in flight at any moment
+    q = asyncio.Queue(maxsize=CONCURRENCY * 2)
+    # worker count is the AIMD ceiling; the semaphore decides how many of
+    # them may actually be in flight at a time
+    asem = AdaptiveSemaphore(CONCURRENCY)
+    n_workers = asem._ceiling
+
+    # per-host cap on top of the global one; semaphores are created lazily
+    # since most hosts only ever hold one URL
+    host_sems = {}
+
+    def host_sem(u):
+        host = urlparse(u).netloc
+        sem = host_sems.get(host)
+        if sem is None:
+            sem = host_sems[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+        return sem
+
+    async def worker(i):
+        while True:
+            u = await q.get()
+            try:
+                async with asem, host_sem(u):
+                    t_ms = adaptive_timeout_ms(state.get(u, {}))
+                    # HTTP fast path first; only fall back to a real browser
+                    # when a keyword matched and JS rendering might change it
+                    status, reason, needs_browser, rt_ms, final = await check_one_http(client, u, t_ms)
+                    # with JS off the browser would refetch the same
+                    # server-rendered HTML and reach the same verdict
+                    if needs_browser and JS_RENDER:
+                        # redirects were already resolved; navigate straight
+                        # to the terminal URL
+                        pool = await shards.pool_for(i)
+                        status, reason, rt_ms = await check_one(pool, final or u, t_ms)
+                asem.report(reason == "TIMEOUT")
+                update_state_one(state, u, status, reason, rt_ms, final, ts)
+            except Exception as e:
+                # a dead worker leaves the producer hanging on q.join();
+                # record the failure as a result and keep consuming
+                print(f"[WORKER] {u}: {type(e).__name__}: {e}")
+                try:
+                    update_state_one(state, u, None, f"ERROR:{type(e).__name__}", None, None, ts)
+                except Exception:
+                    pass  # journal write failed too; the log line above remains
+            finally:
+                q.task_done()
 
-        async def worker(u):
-            async with sem:
-                return await check_one(ctx, u)
+    workers = [asyncio.create_task(worker(i)) for i in range(n_workers)]
 
-        for i in range(0, len(domains), BATCH_SIZE):
-            batch = domains[i:i+BATCH_SIZE]
-            tasks = [asyncio.create_task(worker(u)) for u in batch]
-            results.extend(await asyncio.gather(*tasks))
+    for u in interleave_by_host(domains):
+        await q.put(u)
+    await q.join()
 
+    for w in workers:
+        w.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+    await client.aclose()
+
+    return state
+
+async def setup_shards(p):
+    return [await setup_browser(p) for _ in range(BROWSER_SHARDS)]
+
+async def close_shards(shards):
+    for browser, ctx in shards:
         await ctx.close()
         await browser.close()
 
-    # update state
-    for url, status, reason in results:
-        prev = state.get(url, {})
-        instant = is_instant_down(reason, status)
-
-        if reason is None:
-            state[url] = {
-                "fail_count": 0,
-                "last_status": status,
-                "last_reason": None,
-                "instant_down": False,
-                "last_ok": now_utc(),
-                "last_checked": now_utc(),
-            }
-        else:
-            state[url] = {
-                "fail_count": int(prev.get("fail_count", 0)) + 1,
-                "last_status": status,
-                "last_reason": reason,
-                "instant_down": instant,
-                "last_ok": prev.get("last_ok"),
-                "last_checked": now_utc(),
-            }
-
+async def run_checks(domains, state):
+    async with async_playwright() as p:
+        # browsers stay unlaunched until some check actually escalates,
+        # so there is nothing to overlap the prefilter with
+        prefiltered = await dns_prefilter(domains)
+        shards = LazyShards(p)
+        try:
+            state = await run_one_pass(shards, domains, state, prefiltered=prefiltered)
+        finally:
+            await shards.close()
     return state
 
+async def run_daemon(domains, state):
+    # keep playwright + browsers + contexts alive across passes;
+    # restart them every BROWSER_RESTART_HOURS to avoid slow leaks
+    async with async_playwright() as p:
+        shards = LazyShards(p)
+        born = time.time()
+        try:
+            while True:
+                state = await run_one_pass(shards, domains, state)
+
+                up = sum(1 for st in state.values() if classify(st) == "UP")
+                down = sum(1 for st in state.values() if classify(st) == "DOWN")
+                fail_tmp = len(state) - up - down
+                print(f"[DAEMON] {now_utc()} | total={len(state)} | UP={up} | FAIL_TMP={fail_tmp} | DOWN={down}")
+
+                if time.time() - born > BROWSER_RESTART_HOURS * 3600:
+                    save_state(state)  # compact the journal while we're at it
+                    # drop the browsers; they relaunch on the next escalation
+                    await shards.close()
+                    born = time.time()
+
+                await asyncio.sleep(INTERVAL_SEC)
+        finally:
+            await shards.close()
+
 # ---------------- Message formatting (Domains only) ----------------
 
-def build_summary(title: str, state: dict) -> str:
-    total = len(state)
+def _summarize_chunk(items):
+    # top-level so ProcessPoolExecutor can pickle it; classification is
+    # inlined so each entry is read exactly once
     up = fail_tmp = down = 0
-
-    # group -> set(domains)
     groups = {}
 
-    for url, st in state.items():
-        dom = only_domain(url)
-        cls = classify(st)
+    for url, st in items:
+        fc = int(st.get("fail_count", 0))
+        instant = st.get("instant_down")
 
-        if cls == "UP":
+        if not instant and fc == 0:
             up += 1
             continue
 
-        if cls == "DOWN":
+        if instant or fc >= FAIL_THRESHOLD:
             down += 1
         else:
             fail_tmp += 1
 
         gname = reason_group(st)
-        groups.setdefault(gname, set()).add(dom)
+        dom = only_domain(url)
+        if gname == "DOWN — ERROR/DNS":
+            # this bucket lumps every error type; show which one it was
+            dom = f"{dom} — {short_reason(st.get('last_reason'))}"
+        groups.setdefault(gname, []).append(dom)
+
+    return up, fail_tmp, down, groups
+
+# below this, classification is fanned out across processes on report
+_PARALLEL_SUMMARY_MIN = 50000
+
+def build_summary(title: str, state: dict) -> str:
+    total = len(state)
+
+    if total > _PARALLEL_SUMMARY_MIN:
+        from concurrent.futures import ProcessPoolExecutor
+
+        items = list(state.items())
+        nproc = os.cpu_count() or 2
+        step = -(-total // nproc)  # ceil
+        chunks = [items[i:i + step] for i in range(0, total, step)]
+
+        up = fail_tmp = down = 0
+        groups = {}
+        with ProcessPoolExecutor(max_workers=nproc) as ex:
+            for c_up, c_fail, c_down, c_groups in ex.map(_summarize_chunk, chunks):
+                up += c_up
+                fail_tmp += c_fail
+                down += c_down
+                for gname, doms in c_groups.items():
+                    groups.setdefault(gname, []).extend(doms)
+    else:
+        up, fail_tmp, down, groups = _summarize_chunk(state.items())
 
     lines = [
         f"{title} (UTC): {now_utc()}",
@@ -270,7 +931,7 @@ def build_summary(title: str, state: dict) -> str:
     order = [
         "DOWN — ERROR/DNS",
         "DOWN — HTTP 404",
-        f"FAIL_TMP — TIMEOUT ({TIMEOUT_MS//1000}s)",
+        _TIMEOUT_GROUP,
         "FAIL_TMP — HTTP 5xx",
         "FAIL_TMP — PASSWORD PAGE",
         "FAIL_TMP — SOFT ERROR (keyword)",
@@ -278,27 +939,62 @@ def build_summary(title: str, state: dict) -> str:
     ]
 
     for key in order:
-        doms = sorted(groups.get(key, []))
+        doms = sorted(dict.fromkeys(groups.get(key, [])))
         if not doms:
             continue
         lines.append(f"\n{key} ({len(doms)}):")
-        for d in doms:
-            lines.append(f"- {d}")
+        lines.extend(f"- {d}" for d in doms)
 
     if len(lines) <= 3:
         lines.append("\n✅ All domains look OK.")
+        return "\n".join(lines)
+
+    details = down_details(state)
+    if details:
+        lines.append(details)
 
     return "\n".join(lines)
 
+def down_details(state: dict) -> str:
+    # top DOWN entries by fail_count; nlargest keeps only MAX_REPORT_ITEMS
+    # in memory instead of sorting the full DOWN list
+    worst = heapq.nlargest(
+        MAX_REPORT_ITEMS,
+        (
+            (url, st) for url, st in state.items()
+            if st.get("instant_down") or int(st.get("fail_count", 0)) >= FAIL_THRESHOLD
+        ),
+        key=lambda it: int(it[1].get("fail_count", 0)),
+    )
+    if not worst:
+        return ""
+    body = "\n".join(
+        f"- {only_domain(url)} | fail={st.get('fail_count', 0)}"
+        f" | status={st.get('last_status') or '-'}"
+        f" | {short_reason(st.get('last_reason'))}"
+        f" | last_ok={st.get('last_ok') or 'never'}"
+        for url, st in worst
+    )
+    return f"\nWorst DOWN (top {len(worst)}):\n{body}"
+
 # ---------------- Main ----------------
 
 def main():
+    # uvloop is a drop-in; with 30+ concurrent sockets it cuts event-loop
+    # overhead noticeably, but the selector loop works fine without it
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
     domains = read_domains()
     state = load_state()
 
     if MODE == "check":
+        # run_one_pass journals every change; the full snapshot is only
+        # compacted on report
         state = asyncio.run(run_checks(domains, state))
-        save_state(state)
 
         # Manual run: send immediately for test
         if FORCE_SEND:
@@ -311,15 +1007,19 @@ def main():
         fail_tmp = len(state) - up - down
         print(f"[CHECK] {now_utc()} | total={len(state)} | UP={up} | FAIL_TMP={fail_tmp} | DOWN={down}")
 
+    elif MODE == "daemon":
+        asyncio.run(run_daemon(domains, state))
+
     elif MODE == "report":
         msg = build_summary("🧾 Night Monitor Summary", state)
-        send_telegram(msg)
-        # reset after report
+        asyncio.run(send_telegram_async(msg))
+        # reset strictly after the send: if Telegram fails, the night's
+        # state survives and the next report retries with data intact
         save_state({})
         print("[REPORT] sent + state reset")
 
     else:
-        raise ValueError("MODE must be check or report")
+        raise ValueError("MODE must be check, report or daemon")
 
 if __name__ == "__main__":
     main()